@@ -3,6 +3,8 @@ from rdflib.namespace import XSD
 import os
 from pathlib import Path
 
+from query_planner import QueryPlan, QueryPlanner
+
 
 class ETourismKG:
     """Knowledge Graph Pipeline for e-Tourism Domain"""
@@ -21,6 +23,11 @@ class ETourismKG:
         self.graph.bind("owl", OWL)
         self.graph.bind("xsd", XSD)
         
+        # Statistics-driven join-order optimizer used by query_graph().
+        # Call self.planner.refresh_statistics() after modifying self.graph
+        # directly; load_ontology() and create_instances() do it already.
+        self.planner = QueryPlanner(self.graph)
+        
         print("✓ Knowledge Graph initialized")
     
     def load_ontology(self, ontology_path):
@@ -29,6 +36,7 @@ class ETourismKG:
         """
         try:
             self.graph.parse(ontology_path, format="turtle")
+            self.planner.refresh_statistics()
             print(f"✓ Ontology loaded from: {ontology_path}")
             print(f"  Triples in graph: {len(self.graph)}")
         except Exception as e:
@@ -175,6 +183,8 @@ class ETourismKG:
         
         print(f"  ✓ Created {2} activities")
         
+        self.planner.refresh_statistics()
+        
         total_triples = len(self.graph)
         print(f"\n✓ Total triples in graph: {total_triples}")
     
@@ -197,20 +207,52 @@ class ETourismKG:
             print(f"✗ Error serializing graph: {e}")
             raise
     
-    def query_graph(self, sparql_query, description=""):
+    def query_graph(self, sparql_query, description="", optimize=True):
         """
         Execute a SPARQL query on the graph
+        Basic graph patterns are reordered by the query planner unless
+        optimize is False. If planning fails the error is reported and
+        the query runs unoptimized.
+        A QueryPlan returned by explain_query() is run exactly as planned
         """
         if description:
             print(f"\n--- {description} ---")
-        
+
+        query = sparql_query
+        planner_error = None
+        if isinstance(sparql_query, QueryPlan):
+            query = sparql_query.query if optimize else sparql_query.sparql_query
+        elif optimize:
+            try:
+                query = self.planner.plan(sparql_query).query
+            except Exception as e:
+                planner_error = e
+                query = sparql_query
+
         try:
-            results = self.graph.query(sparql_query)
+            results = self.graph.query(query)
+            # Invalid queries fail above too and are reported as query errors only
+            if planner_error is not None:
+                print(f"✗ Query planner error, ran unoptimized: {planner_error}")
             return results
         except Exception as e:
             print(f"✗ Query error: {e}")
             return None
     
+    def explain_query(self, sparql_query, description=""):
+        """
+        Return the execution plan chosen for a SPARQL query
+        without running it
+        """
+        if description:
+            print(f"\n--- {description} ---")
+        
+        try:
+            return self.planner.plan(sparql_query)
+        except Exception as e:
+            print(f"✗ Query error: {e}")
+            return None
+    
     def print_statistics(self):
         """Print graph statistics"""
         print("\n--- Knowledge Graph Statistics ---")
@@ -0,0 +1,615 @@
+from itertools import product
+
+from rdflib import RDF, BNode, Literal, URIRef, Variable
+from rdflib.namespace import XSD
+from rdflib.paths import AlternativePath, InvPath, MulPath, NegatedPath, Path, SequencePath
+# The rewriter works on rdflib's SPARQL algebra node layout, which is not a
+# stable API; it is written against the rdflib==7.0.0 pin in requirements.txt
+from rdflib.plugins.sparql.algebra import Filter, Join, ToMultiSet, Values, translateQuery
+from rdflib.plugins.sparql.evaluate import evalBGP
+from rdflib.plugins.sparql.operators import and_
+from rdflib.plugins.sparql.parser import parseQuery
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql import CUSTOM_EVALS
+
+
+# Default selectivities for FILTER expressions we cannot estimate from the statistics
+EQUALITY_SELECTIVITY = 0.1
+RANGE_SELECTIVITY = 0.33
+
+
+def _eval_ordered_bgp(ctx, part):
+    """
+    Evaluate a planned BGP exactly in the order chosen by the planner.
+    rdflib's default BGP evaluation re-sorts the patterns at runtime,
+    which would undo the cardinality-based ordering.
+    """
+    if part.name != "OrderedBGP":
+        raise NotImplementedError()
+    return evalBGP(ctx, part.triples)
+
+
+CUSTOM_EVALS["etourism_ordered_bgp"] = _eval_ordered_bgp
+
+
+class PredicateStatistics:
+    """Cardinality statistics for a single predicate"""
+
+    def __init__(self, count, distinct_subjects, distinct_objects):
+        self.count = count
+        self.distinct_subjects = distinct_subjects
+        self.distinct_objects = distinct_objects
+
+
+class GraphStatistics:
+    """Per-predicate and per-class cardinality statistics of a graph"""
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.triple_count = len(graph)
+
+        subjects = {}
+        objects = {}
+        counts = {}
+        all_subjects = set()
+        all_objects = set()
+        class_members = {}
+
+        for s, p, o in graph:
+            counts[p] = counts.get(p, 0) + 1
+            subjects.setdefault(p, set()).add(s)
+            objects.setdefault(p, set()).add(o)
+            all_subjects.add(s)
+            all_objects.add(o)
+            if p == RDF.type:
+                class_members.setdefault(o, set()).add(s)
+
+        self.predicates = {
+            p: PredicateStatistics(counts[p], len(subjects[p]), len(objects[p]))
+            for p in counts
+        }
+        self.classes = {cls: len(members) for cls, members in class_members.items()}
+        self.distinct_subjects = len(all_subjects)
+        self.distinct_objects = len(all_objects)
+        self.distinct_nodes = len(all_subjects | all_objects)
+
+    def estimate(self, triple, bound, seeds=None):
+        """
+        Estimate how many triples match a pattern for one incoming solution,
+        given the set of variables already bound by earlier steps and the
+        constants seeded for some of them
+        """
+        seeds = seeds or {}
+        s, p, o = triple
+        s_bound = _is_bound(s, bound)
+        o_bound = _is_bound(o, bound)
+
+        if isinstance(p, Path):
+            return self._estimate_path(p, s_bound, o_bound)
+
+        if not _is_bound(p, bound):
+            return self._scale(self.triple_count, self.distinct_subjects,
+                               self.distinct_objects, s_bound, o_bound)
+
+        if isinstance(p, (Variable, BNode)):
+            # Bound at runtime to a predicate we cannot see yet
+            count = self.triple_count / max(1, len(self.predicates))
+            return self._scale(count, self.distinct_subjects,
+                               self.distinct_objects, s_bound, o_bound)
+
+        if p == RDF.type and _is_constant(o):
+            members = self.classes.get(o, 0)
+            if s_bound and s not in seeds:
+                typed = self.predicates[RDF.type].distinct_subjects if RDF.type in self.predicates else 1
+                return min(1.0, members / max(1, typed))
+            if not s_bound:
+                return members
+
+        s_values = [s] if _is_constant(s) else seeds.get(s)
+        o_values = [o] if _is_constant(o) else seeds.get(o)
+        stats = self.predicates.get(p)
+        if stats is None:
+            return 0
+
+        if s_values is not None or o_values is not None:
+            # Exact average count from the graph index for patterns anchored on constants
+            lookups = list(product(s_values or [None], o_values or [None]))
+            count = sum(1 for ls, lo in lookups for _ in self.graph.triples((ls, p, lo))) / len(lookups)
+            return self._scale(count, stats.distinct_subjects, stats.distinct_objects,
+                               s_bound and s_values is None, o_bound and o_values is None)
+
+        return self._scale(stats.count, stats.distinct_subjects,
+                           stats.distinct_objects, s_bound, o_bound)
+
+    def _estimate_path(self, path, s_bound, o_bound):
+        """Rough estimate for a property path from its component predicates"""
+        predicates = _path_predicates(path)
+        count = sum(self.predicates[p].count for p in predicates if p in self.predicates)
+
+        if isinstance(path, MulPath) and path.zero:
+            # Zero-length paths match every node when both ends are free
+            count += self.distinct_nodes
+
+        return self._scale(count, self.distinct_subjects,
+                           self.distinct_objects, s_bound, o_bound)
+
+    def _scale(self, count, distinct_subjects, distinct_objects, s_bound, o_bound):
+        estimate = float(count)
+        if s_bound:
+            estimate /= max(1, distinct_subjects)
+        if o_bound:
+            estimate /= max(1, distinct_objects)
+        return estimate
+
+
+class PlanStep:
+    """A single step of a BGP execution plan"""
+
+    def __init__(self, kind, description, estimated_rows):
+        self.kind = kind
+        self.description = description
+        self.estimated_rows = estimated_rows
+
+    def __str__(self):
+        return f"{self.kind:<7} {self.description:<60} rows≈{self.estimated_rows:.1f}"
+
+
+class BGPPlan:
+    """Execution plan chosen for one basic graph pattern"""
+
+    def __init__(self, steps, cost):
+        self.steps = steps
+        self.cost = cost
+
+    def __str__(self):
+        lines = [f"BGP plan (estimated cost {self.cost:.1f})"]
+        for i, step in enumerate(self.steps, 1):
+            lines.append(f"  {i}. {step}")
+        return "\n".join(lines)
+
+
+class QueryPlan:
+    """Optimized query together with the plans of all its BGPs"""
+
+    def __init__(self, sparql_query, query, bgp_plans):
+        self.sparql_query = sparql_query
+        self.query = query
+        self.bgp_plans = bgp_plans
+
+    def __str__(self):
+        if not self.bgp_plans:
+            return "(no basic graph patterns to plan)"
+        return "\n\n".join(str(plan) for plan in self.bgp_plans)
+
+
+class QueryPlanner:
+    """
+    Statistics-driven join-order optimizer for basic graph patterns.
+
+    Triple patterns are reordered greedily by estimated cardinality,
+    FILTER conjuncts are evaluated as soon as their variables are bound,
+    and equality filters against constants seed the plan with those
+    constants so the first patterns become index lookups.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._statistics = None
+
+    @property
+    def statistics(self):
+        """
+        Graph statistics, built on first use with one full scan of the graph.
+        They are not updated automatically: call refresh_statistics() after
+        adding or removing triples.
+        """
+        if self._statistics is None:
+            self._statistics = GraphStatistics(self.graph)
+        return self._statistics
+
+    def refresh_statistics(self):
+        """Discard the statistics so the next plan rebuilds them"""
+        self._statistics = None
+
+    def plan(self, sparql_query):
+        """
+        Parse a SPARQL query and return a QueryPlan whose query attribute
+        can be passed directly to Graph.query()
+        """
+        query = translateQuery(parseQuery(sparql_query), initNs=dict(self.graph.namespaces()))
+        bgp_plans = []
+        query.algebra = self._optimize(query.algebra, bgp_plans)
+        return QueryPlan(sparql_query, query, bgp_plans)
+
+    def _optimize(self, node, bgp_plans):
+        if not isinstance(node, CompValue):
+            return node
+
+        if node.name == "Filter" and not node.no_isolated_scope:
+            node = _push_filter(node)
+            if node.name == "Filter" and isinstance(node.p, CompValue) and \
+                    node.p.name == "BGP" and node.p.triples:
+                return self._plan_bgp(node.p.triples, _conjuncts(node.expr), bgp_plans)
+
+        if node.name == "BGP" and node.triples:
+            return self._plan_bgp(node.triples, [], bgp_plans)
+
+        for key in ("p", "p1", "p2"):
+            if key in node:
+                node[key] = self._optimize(node[key], bgp_plans)
+        return node
+
+    def _plan_bgp(self, triples, filters, bgp_plans):
+        """Build a left-deep evaluation tree for one BGP and its filters"""
+        statistics = self.statistics
+        nsm = self.graph.namespace_manager
+
+        bgp_vars = set()
+        for triple in triples:
+            bgp_vars |= _triple_vars(triple)
+
+        # Filters on variables the BGP never binds, or containing
+        # EXISTS patterns, stay on top of the plan as before
+        pending = []
+        deferred = []
+        for expr in filters:
+            expr_vars = _expr_vars(expr)
+            if expr_vars <= bgp_vars and not _contains_exists(expr):
+                pending.append((expr, expr_vars))
+            else:
+                deferred.append(expr)
+
+        steps = []
+        tree = None
+        bound = set()
+        rows = 1.0
+        cost = 0.0
+
+        # Equality filters against constants can seed a variable instead of
+        # scanning for it; a seed is only used if it beats the plain scan
+        seeds = self._seeds([expr for expr, _ in pending], bgp_vars)
+        used_seeds = set()
+
+        def choose(triple):
+            """Return (total estimate, estimate per seeded value, seeds to use)"""
+            plain = statistics.estimate(triple, bound)
+            seedable = {v: seeds[v] for v in _triple_vars(triple) - bound if v in seeds}
+            if seedable:
+                terms = {v: _seed_term_list(groups) for v, groups in seedable.items()}
+                term_fanout = 1
+                distinct = 1
+                for v, groups in seedable.items():
+                    term_fanout *= len(terms[v])
+                    distinct *= len(groups)
+                # An empty seed (contradictory filters) makes the fanout 0, so
+                # the seeded VALUES node yields no rows and the BGP is empty
+                if not distinct:
+                    return 0.0, 0.0, seedable
+                total = term_fanout * statistics.estimate(triple, bound | set(seedable), terms)
+                if total < plain:
+                    return total, total / distinct, seedable
+            return plain, plain, {}
+
+        remaining = list(triples)
+        chunk = []
+        while remaining:
+            connected = [t for t in remaining if _triple_vars(t) & bound or not _triple_vars(t)]
+            candidates = connected or remaining
+            choices = {i: choose(t) for i, t in enumerate(candidates)}
+            i = min(choices, key=lambda i: choices[i][0])
+            best = candidates[i]
+            _, estimate, seedable = choices[i]
+
+            if seedable:
+                if chunk:
+                    tree = _join(tree, _ordered_bgp(chunk))
+                    chunk = []
+                names = sorted(seedable, key=str)
+                terms = [_seed_term_list(seedable[v]) for v in names]
+                res = [dict(zip(names, values)) for values in product(*terms)]
+                tree = _join(tree, _values(names, res))
+                for var in names:
+                    # One row per constant written in the filters; the extra
+                    # xsd:string spellings only add VALUES rows that match nothing
+                    rows *= len(seedable[var])
+                    values = ", ".join(constant.n3(nsm) for constant, _ in seedable[var])
+                    steps.append(PlanStep("SEED", f"{var.n3()} IN ({values})", rows))
+                used_seeds |= set(names)
+                bound |= set(names)
+
+            remaining.remove(best)
+            chunk.append(best)
+            bound |= _triple_vars(best)
+            rows *= estimate
+            cost += rows
+            steps.append(PlanStep("SCAN", " ".join(_n3(term, nsm) for term in best), rows))
+
+            ready = [(expr, expr_vars) for expr, expr_vars in pending if expr_vars <= bound]
+            if ready:
+                tree = _join(tree, _ordered_bgp(chunk))
+                chunk = []
+                for expr, expr_vars in ready:
+                    pending.remove((expr, expr_vars))
+                    tree = _filter(expr, tree)
+                    rows *= _selectivity(expr, used_seeds)
+                    steps.append(PlanStep("FILTER", _describe(expr, nsm), rows))
+
+        if chunk:
+            tree = _join(tree, _ordered_bgp(chunk))
+
+        for expr in deferred:
+            tree = _filter(expr, tree)
+            rows *= _selectivity(expr, used_seeds)
+            steps.append(PlanStep("FILTER", _describe(expr, nsm), rows))
+
+        bgp_plans.append(BGPPlan(steps, cost))
+        return tree
+
+    def _seeds(self, filters, bgp_vars):
+        """
+        Collect constant bindings implied by equality filters, as a list of
+        (constant, terms) groups per variable. Only IRIs and plain strings are
+        seeded, since for those the '=' operator matches exactly the seeded
+        terms; numeric equality compares by value.
+        """
+        seeds = {}
+        for expr in filters:
+            found = _equality_constants(expr)
+            if found is None:
+                continue
+            var, groups = found
+            if var not in bgp_vars:
+                continue
+            if var in seeds:
+                allowed = _seed_term_list(groups)
+                groups = [(constant, [term for term in terms if term in allowed])
+                          for constant, terms in seeds[var]]
+                groups = [(constant, terms) for constant, terms in groups if terms]
+            seeds[var] = groups
+        return seeds
+
+
+def _push_filter(node):
+    """
+    Move FILTER conjuncts that only use variables of the leftmost BGP below
+    enclosing joins, optionals and minus, so they are planned with that BGP
+    """
+    target = node.p
+    path = []
+    while isinstance(target, CompValue) and target.name in ("Join", "LeftJoin", "Minus"):
+        path.append(target)
+        target = target.p1
+    if not path or not isinstance(target, CompValue) or target.name != "BGP":
+        return node
+
+    bgp_vars = set()
+    for triple in target.triples:
+        bgp_vars |= _triple_vars(triple)
+
+    pushed = []
+    kept = []
+    for expr in _conjuncts(node.expr):
+        if _expr_vars(expr) <= bgp_vars and not _contains_exists(expr):
+            pushed.append(expr)
+        else:
+            kept.append(expr)
+    if not pushed:
+        return node
+
+    path[-1]["p1"] = _filter(and_(*pushed), target)
+    if not kept:
+        return node.p
+    node["expr"] = and_(*kept)
+    return node
+
+
+# Every node built below carries a "_vars" scope computed with the same rules
+# as rdflib's translateQuery: evalFilter and LeftJoin read it to decide which
+# outer bindings are forgotten. It is set here rather than by rerunning
+# rdflib's private helpers.
+
+def _ordered_bgp(triples):
+    node = CompValue("OrderedBGP", triples=triples)
+    node["_vars"] = set().union(*(_triple_vars(triple) for triple in triples))
+    return node
+
+
+def _values(names, res):
+    node = ToMultiSet(Values(res))
+    node["_vars"] = set(names)
+    return node
+
+
+def _filter(expr, p):
+    node = Filter(expr=expr, p=p)
+    node["_vars"] = _scope_vars(expr) | p["_vars"]
+    return node
+
+
+def _scope_vars(expr):
+    """
+    Variables an expression adds to a FILTER's scope. As in rdflib, a
+    comparison contributes none, so a FILTER in a nested group cannot see
+    outer bindings that its own pattern does not bind.
+    """
+    if isinstance(expr, Variable):
+        return {expr}
+    found = set()
+    if isinstance(expr, CompValue):
+        if expr.name == "RelationalExpression":
+            return found
+        for key, value in expr.items():
+            if not key.startswith("_"):
+                found |= _scope_vars(value)
+    elif isinstance(expr, list):
+        for value in expr:
+            found |= _scope_vars(value)
+    return found
+
+
+def _join(left, right):
+    """
+    Lazy join, so the right side is evaluated with the bindings of the
+    left side pushed into it, i.e. an index nested-loop join
+    """
+    if left is None:
+        return right
+    join = Join(p1=left, p2=right)
+    join["lazy"] = True
+    join["_vars"] = left["_vars"] | right["_vars"]
+    return join
+
+
+def _is_constant(term):
+    return not isinstance(term, (Variable, BNode))
+
+
+def _is_bound(term, bound):
+    return _is_constant(term) or term in bound
+
+
+def _triple_vars(triple):
+    return {term for term in triple if isinstance(term, (Variable, BNode))}
+
+
+def _path_predicates(path):
+    if isinstance(path, URIRef):
+        return [path]
+    if isinstance(path, (SequencePath, AlternativePath, NegatedPath)):
+        return [p for arg in path.args for p in _path_predicates(arg)]
+    if isinstance(path, InvPath):
+        return _path_predicates(path.arg)
+    if isinstance(path, MulPath):
+        return _path_predicates(path.path)
+    return []
+
+
+def _n3(term, nsm):
+    if isinstance(term, Path):
+        return term.n3(nsm)
+    return term.n3(nsm) if _is_constant(term) else term.n3()
+
+
+def _conjuncts(expr):
+    """Split a FILTER expression into its top-level && operands"""
+    if isinstance(expr, CompValue) and expr.name == "ConditionalAndExpression":
+        result = _conjuncts(expr.expr)
+        for other in expr.other or []:
+            result.extend(_conjuncts(other))
+        return result
+    return [expr]
+
+
+def _expr_vars(expr):
+    if isinstance(expr, Variable):
+        return {expr}
+    found = set()
+    if isinstance(expr, CompValue):
+        for key, value in expr.items():
+            if not key.startswith("_"):
+                found |= _expr_vars(value)
+    elif isinstance(expr, list):
+        for value in expr:
+            found |= _expr_vars(value)
+    return found
+
+
+def _contains_exists(expr):
+    if isinstance(expr, CompValue):
+        if expr.name in ("Builtin_EXISTS", "Builtin_NOTEXISTS"):
+            return True
+        return any(_contains_exists(value) for key, value in expr.items() if not key.startswith("_"))
+    if isinstance(expr, list):
+        return any(_contains_exists(value) for value in expr)
+    return False
+
+
+def _seed_terms(term):
+    """Terms that compare equal to a constant under SPARQL '='"""
+    if isinstance(term, URIRef):
+        return [term]
+    if isinstance(term, Literal) and term.language is None and term.datatype in (None, XSD.string):
+        return [Literal(str(term)), Literal(str(term), datatype=XSD.string)]
+    return None
+
+
+def _seed_term_list(groups):
+    terms = []
+    for _, group_terms in groups:
+        terms.extend(term for term in group_terms if term not in terms)
+    return terms
+
+
+def _equality_constants(expr):
+    """
+    Return (variable, groups) when expr restricts a variable to a set of
+    constants, e.g. ?v = "a", ?v = "a" || ?v = "b" or sameTerm(?v, <iri>).
+    Each group pairs a constant as written in the filter with the terms
+    that match it.
+    """
+    if not isinstance(expr, CompValue):
+        return None
+
+    if expr.name == "Builtin_sameTerm":
+        var, term = expr.arg1, expr.arg2
+        if isinstance(term, Variable):
+            var, term = term, var
+        if isinstance(var, Variable) and isinstance(term, (URIRef, Literal)):
+            return var, [(term, [term])]
+        return None
+
+    if expr.name == "RelationalExpression" and expr.op == "=":
+        var, term = expr.expr, expr.other
+        if isinstance(term, Variable):
+            var, term = term, var
+        if not isinstance(var, Variable):
+            return None
+        terms = _seed_terms(term)
+        if terms is None:
+            return None
+        return var, [(term, terms)]
+
+    if expr.name == "ConditionalOrExpression":
+        var = None
+        groups = []
+        for operand in [expr.expr] + list(expr.other or []):
+            found = _equality_constants(operand)
+            if found is None or (var is not None and found[0] != var):
+                return None
+            var = found[0]
+            groups.extend(group for group in found[1] if group not in groups)
+        return var, groups
+
+    return None
+
+
+def _selectivity(expr, seeds):
+    found = _equality_constants(expr)
+    if found is None:
+        return RANGE_SELECTIVITY
+    if found[0] in seeds:
+        # Already enforced by the seeded constants
+        return 1.0
+    return EQUALITY_SELECTIVITY
+
+
+def _describe(expr, nsm):
+    """Compact, human-readable rendering of a FILTER expression"""
+    if isinstance(expr, Variable):
+        return expr.n3()
+    if isinstance(expr, (URIRef, Literal)):
+        return expr.n3(nsm)
+    if not isinstance(expr, CompValue):
+        return str(expr)
+
+    if expr.name == "RelationalExpression":
+        return f"{_describe(expr.expr, nsm)} {expr.op} {_describe(expr.other, nsm)}"
+    if expr.name in ("Builtin_EXISTS", "Builtin_NOTEXISTS"):
+        return ("NOT EXISTS" if expr.name == "Builtin_NOTEXISTS" else "EXISTS") + " { ... }"
+    if expr.name in ("ConditionalAndExpression", "ConditionalOrExpression"):
+        op = " && " if expr.name == "ConditionalAndExpression" else " || "
+        operands = [expr.expr] + list(expr.other or [])
+        return "(" + op.join(_describe(operand, nsm) for operand in operands) + ")"
+
+    args = [_describe(value, nsm) for key, value in expr.items() if not key.startswith("_")]
+    return f"{expr.name.replace('Builtin_', '')}({', '.join(args)})"
@@ -172,8 +172,12 @@ class SPARQLQueries:
         print("Objective: Find affordable ($ or $$) hotels in Oran with rating >= 3.5")
         print("\nSPARQL Query:")
         print(query)
+        print("\nExecution Plan:")
+        plan = self.kg.explain_query(query)
+        print(plan)
         
-        results = self.kg.query_graph(query)
+        # Run the plan printed above instead of planning the query again
+        results = self.kg.query_graph(plan or query)
         
         print("\nResults:")
         print(f"{'Hotel':<25} {'Rating':<10} {'Price':<10} {'Capacity':<10}")
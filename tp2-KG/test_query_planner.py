@@ -0,0 +1,154 @@
+import contextlib
+import functools
+import io
+from pathlib import Path
+
+import pytest
+from rdflib import Literal, RDF
+from rdflib.namespace import XSD
+
+from kg_pipeline import ETourismKG
+from sparql_queries import SPARQLQueries
+
+
+ONTOLOGY_PATH = Path(__file__).parent / "ontology" / "etourism_ontology.ttl"
+
+PREFIXES = """
+PREFIX etour: <http://www.semanticweb.org/ontologies/etourism#>
+PREFIX ex: <http://www.example.org/etourism/instances#>
+"""
+
+QUERY_METHODS = [name for name in dir(SPARQLQueries) if name.startswith("query_")]
+
+EXTRA_QUERIES = {
+    "optional": """
+        SELECT ?hotel ?city ?email WHERE {
+            ?hotel a etour:Hotel ;
+                   etour:priceRange ?price ;
+                   etour:locatedIn ?cityObj .
+            ?cityObj etour:name ?city .
+            OPTIONAL { ?hotel etour:hasEmail ?email }
+            FILTER (?city = "City7" && (?price = "$$" || ?price = "$$$") && !bound(?email))
+        }
+    """,
+    "minus": """
+        SELECT ?place ?name WHERE {
+            ?place etour:name ?name .
+            FILTER (?name = "Ibis Oran" || ?name = "Le Mirage" || ?name = "H7")
+            MINUS { ?place a etour:Hotel }
+        }
+    """,
+    "union": """
+        SELECT ?place ?text WHERE {
+            { ?place etour:name ?text } UNION { ?place etour:description ?text }
+            ?place etour:rating ?rating .
+            FILTER (?rating > 4.4)
+        }
+    """,
+    "not_exists": """
+        SELECT ?place WHERE {
+            ?place etour:locatedIn ?city .
+            ?city etour:name ?name .
+            FILTER (sameTerm(?city, ex:Oran))
+            FILTER NOT EXISTS { ?place a etour:Hotel }
+        }
+    """,
+    "variable_predicate": """
+        SELECT ?p ?o WHERE {
+            ?hotel etour:name "Ibis Oran" ;
+                   ?p ?o .
+            FILTER (?p = etour:rating || ?p = etour:capacity)
+        }
+    """,
+    "nested_group_filter_scope": """
+        SELECT ?hotel ?name WHERE {
+            ?hotel etour:name ?name .
+            { ?hotel etour:rating ?rating . FILTER (?name = "Ibis Oran") }
+        }
+    """,
+    "bind_filter_scope": """
+        SELECT ?hotel ?name WHERE {
+            BIND ("Ibis Oran" AS ?wanted)
+            { ?hotel etour:name ?name FILTER (?name = ?wanted) }
+        }
+    """,
+    "subquery_filter_scope": """
+        SELECT ?hotel ?name WHERE {
+            ?hotel etour:name ?name .
+            { SELECT ?hotel WHERE { ?hotel etour:rating ?rating FILTER (?name = "Ibis Oran") } }
+        }
+    """,
+    "contradictory_literals": """
+        SELECT ?hotel WHERE {
+            ?hotel etour:priceRange ?price .
+            FILTER (?price = "$" && ?price = "$$")
+        }
+    """,
+    "contradictory_iris": """
+        SELECT ?place WHERE {
+            ?place etour:locatedIn ?city .
+            FILTER (?city = ex:Oran)
+            FILTER (?city = ex:Algiers)
+        }
+    """,
+}
+
+
+@pytest.fixture(scope="module")
+def kg():
+    """Sample KG extended with enough synthetic hotels to make join order matter"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        kg = ETourismKG()
+        kg.load_ontology(str(ONTOLOGY_PATH))
+        kg.create_instances()
+
+    for c in range(20):
+        city = kg.EX[f"City{c}"]
+        kg.graph.add((city, RDF.type, kg.ETOUR.City))
+        kg.graph.add((city, kg.ETOUR.name, Literal(f"City{c}")))
+
+    for h in range(300):
+        hotel = kg.EX[f"H{h}"]
+        kg.graph.add((hotel, RDF.type, kg.ETOUR.Hotel))
+        kg.graph.add((hotel, kg.ETOUR.name, Literal(f"H{h}")))
+        kg.graph.add((hotel, kg.ETOUR.rating, Literal(2.0 + (h % 31) / 10, datatype=XSD.float)))
+        kg.graph.add((hotel, kg.ETOUR.priceRange, Literal(["$", "$$", "$$$"][h % 3])))
+        kg.graph.add((hotel, kg.ETOUR.capacity, Literal(50 + h, datatype=XSD.integer)))
+        kg.graph.add((hotel, kg.ETOUR.locatedIn, kg.EX[f"City{h % 20}"]))
+        if h % 5 == 0:
+            kg.graph.add((hotel, kg.ETOUR.hasEmail, Literal(f"h{h}@example.org")))
+        if h % 7 == 0:
+            kg.graph.add((hotel, kg.ETOUR.nearTo, kg.EX[f"H{(h * 13) % 300}"]))
+
+    kg.planner.refresh_statistics()
+    return kg
+
+
+def rows(results):
+    assert results is not None
+    return sorted(tuple(row) for row in results)
+
+
+@pytest.mark.parametrize("method", QUERY_METHODS)
+def test_sparql_queries_match_unplanned(kg, method, monkeypatch):
+    with contextlib.redirect_stdout(io.StringIO()):
+        planned = rows(getattr(SPARQLQueries(kg), method)())
+
+        monkeypatch.setattr(kg, "query_graph",
+                            functools.partial(ETourismKG.query_graph, kg, optimize=False))
+        unplanned = rows(getattr(SPARQLQueries(kg), method)())
+
+    assert planned == unplanned
+
+
+@pytest.mark.parametrize("name", sorted(EXTRA_QUERIES))
+def test_extra_queries_match_unplanned(kg, name):
+    query = PREFIXES + EXTRA_QUERIES[name]
+    assert rows(kg.query_graph(query)) == rows(kg.query_graph(query, optimize=False))
+
+
+def test_contradictory_filters_plan_empty_seed(kg):
+    plan = kg.explain_query(PREFIXES + EXTRA_QUERIES["contradictory_literals"])
+    assert plan is not None
+    assert plan.bgp_plans[0].steps[0].kind == "SEED"
+    assert rows(kg.query_graph(plan)) == []